@@ -0,0 +1,18 @@
+-- Applied after every silver load (etl.py build_silver), then ANALYZE so the
+-- gold refresh plans against fresh statistics.
+
+-- Per-doctor COUNT(DISTINCT patient_id) in gold.doctor_performance
+CREATE INDEX IF NOT EXISTS appointments_doctor_patient_idx
+    ON silver.appointments (doctor_id, patient_id);
+
+-- Index-only scan source for gold.outstanding_revenue
+CREATE INDEX IF NOT EXISTS billing_pending_idx
+    ON silver.billing (patient_id, amount)
+    WHERE payment_status = 'Pending';
+
+-- gold.doctor_performance: DISTINCT departments and each department's doctors
+-- for its top-2 LATERAL (WHERE specialization = ...)
+CREATE INDEX IF NOT EXISTS doctors_specialization_idx
+    ON silver.doctors (specialization, doctor_id);
+
+ANALYZE silver.patients, silver.doctors, silver.appointments, silver.prescriptions, silver.billing;
@@ -1,8 +1,8 @@
 import os
 import logging
-from db import get_connection
+from db import get_conn
 from silver_transform import (
-    transform_patients, transform_doctors,
+    create_silver_functions, create_silver_indexes, transform_patients, transform_doctors,
     transform_appointments, transform_prescriptions, transform_billing
 )
 from gold_transform import build_gold
@@ -37,7 +37,7 @@ logging.basicConfig(
 
 
 # -------------------------
-# Extract From Csv
+# Extract From Sheets (COPY'd straight into bronze.*)
 # -------------------------
 
 
@@ -66,27 +66,25 @@ def build_bronze():
 # -------------------------
 # Silver Builder
 # -------------------------
-def build_silver():
-    conn = get_connection()
+def build_silver(conn):
     try:
         logging.info("=== Building Silver Layer Started ===")
+        create_silver_functions(conn)
         transform_patients(conn)
         transform_doctors(conn)
         transform_appointments(conn)
         transform_prescriptions(conn)
         transform_billing(conn)
+        create_silver_indexes(conn)
         logging.info("=== Building Silver Layer Completed ===")
     except Exception as e:
         logging.error(f"Error in build_silver: {str(e)}")
         raise
-    finally:
-        conn.close()
 
 # -------------------------
 # Gold Builder
 # -------------------------
-def build_gold_layer():
-    conn = get_connection()
+def build_gold_layer(conn):
     try:
         logging.info("=== Building Gold Layer Started ===")
         build_gold(conn)
@@ -94,8 +92,6 @@ def build_gold_layer():
     except Exception as e:
         logging.error(f"Error in build_gold: {str(e)}")
         raise
-    finally:
-        conn.close()
 
 # -------------------------
 # Gold Builder
@@ -120,20 +116,24 @@ if __name__ == "__main__":
     task = sys.argv[1] if len(sys.argv) > 1 else "all"
 
     if task == "extract":
-        _run_step("Extract (Sheets → bronze_inputs CSVs)", extract)
+        _run_step("Extract (Sheets → bronze)", extract)
     elif task == "bronze":
         _run_step("Bronze Layer", build_bronze)
     elif task == "silver":
-        _run_step("Silver Layer", build_silver)
+        with get_conn() as conn:
+            _run_step("Silver Layer", lambda: build_silver(conn))
     elif task == "gold":
-        _run_step("Gold Layer", build_gold_layer)
+        with get_conn() as conn:
+            _run_step("Gold Layer", lambda: build_gold_layer(conn))
     elif task == "export_sheets":
         _run_step("Export to Google Sheets", export_sheets)
     elif task == "all":
-        _run_step("Extract (Sheets → bronze_inputs CSVs)", extract)
-        _run_step("Bronze Layer", build_bronze)
-        _run_step("Silver Layer", build_silver)
-        _run_step("Gold Layer", build_gold_layer)
+        # extract already loads bronze; the bronze task is for reloading CSVs from bronze_inputs
+        _run_step("Extract (Sheets → bronze)", extract)
+        # silver and gold run on one pooled connection (prepared statements stay warm)
+        with get_conn() as conn:
+            _run_step("Silver Layer", lambda: build_silver(conn))
+            _run_step("Gold Layer", lambda: build_gold_layer(conn))
         _run_step("Export to Google Sheets", export_sheets)
     else:
         print("Usage: python etl.py [extract|bronze|silver|gold|export_sheets|all]")
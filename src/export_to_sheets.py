@@ -2,9 +2,10 @@
 import os
 import io
 import re
-import time
 import hashlib
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date, time as dtime
 import numpy as np
 import pandas as pd
@@ -12,10 +13,12 @@ import pandas as pd
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 
-import gspread
-from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import rowcol_to_a1
 from gspread_dataframe import set_with_dataframe
 
+from gsheets import open_spreadsheet, retry, worksheets_by_title
+from gold_views import GOLD_VIEWS
+
 # -------------------------------------------------
 # Env + logging
 # -------------------------------------------------
@@ -27,10 +30,11 @@ SERVICE_ACCOUNT_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
 # export tuning
 CHUNK_ROWS       = 2000
-MAX_RETRIES      = 5
-RETRY_BASE_SLEEP = 1.5
+BATCH_ROWS       = 10000  # rows per values.batchUpdate request (stays well under the 10MB limit)
 RESIZE_STEP_ROWS = 10000
 RESIZE_STEP_COLS = 50
+EXPORT_WORKERS   = 6   # gold tables exported concurrently
+SHEETS_WRITERS   = 4   # concurrent Sheets write calls (60/min write quota)
 
 ROW_LIMITS = {
     # Uncomment if you want to cap big tables
@@ -55,6 +59,13 @@ GOLD_TABLES = [
     "dashboard_summary",
 ]
 
+# ORDER BY per gold view: its sort order, then its unique key, so ties (and a
+# LIMIT under ROW_LIMITS) come out the same on every export
+GOLD_ORDER_BY = {
+    name: ", ".join(order + [f'"{c}"' for c in key if c not in {o.split()[0] for o in order}])
+    for name, key, order, _ in GOLD_VIEWS
+}
+
 # ----------------------
 # LOGGING
 # ----------------------
@@ -70,77 +81,94 @@ logger.addHandler(fh)
 # ----------------------
 # HELPERS
 # ----------------------
-def _retry(fn, *args, **kwargs):
-    for i in range(MAX_RETRIES):
-        try:
-            return fn(*args, **kwargs)
-        except APIError as e:
-            msg = str(e)
-            transient = any(code in msg for code in ("429", "500", "503"))
-            if transient and i < MAX_RETRIES - 1:
-                sleep_s = RETRY_BASE_SLEEP * (2 ** i)
-                logger.warning(f"{fn.__name__} retry {i+1}/{MAX_RETRIES} after {sleep_s:.1f}s due to: {e}")
-                time.sleep(sleep_s)
-                continue
-            raise
-
-
-def _ensure_ws(sh, title: str, rows: int, cols: int):
-    try:
-        ws = sh.worksheet(title)
-        created = False
-    except gspread.exceptions.WorksheetNotFound:
-        ws = _retry(sh.add_worksheet, title=title, rows=max(rows, 2), cols=max(cols, 2))
-        created = True
+_sheets_write_slots = threading.Semaphore(SHEETS_WRITERS)
 
-    try:
-        need_rows = rows > ws.row_count
-        need_cols = cols > ws.col_count
-        if need_rows or need_cols:
-            r = ws.row_count
-            c = ws.col_count
-            target_r = max(rows, 2)
-            target_c = max(cols, 2)
-            while r < target_r or c < target_c:
-                r = min(target_r, r + RESIZE_STEP_ROWS) if r < target_r else r
-                c = min(target_c, c + RESIZE_STEP_COLS) if c < target_c else c
-                _retry(ws.resize, r, c)
-                time.sleep(0.2)
-    except Exception as e:
-        logger.warning(f"Resize skipped for '{title}': {e}")
+# Sheets write calls, each capped at SHEETS_WRITERS in flight across threads
+@retry
+def _resize(ws, rows: int, cols: int):
+    with _sheets_write_slots:
+        ws.resize(rows, cols)
+
+
+@retry
+def _add_worksheet(sh, title: str, rows: int, cols: int):
+    with _sheets_write_slots:
+        return sh.add_worksheet(title=title, rows=rows, cols=cols)
+
+
+@retry
+def _batch_clear(ws, ranges: list):
+    with _sheets_write_slots:
+        ws.batch_clear(ranges)
+
+
+@retry
+def _values_batch_update(sh, body: dict):
+    with _sheets_write_slots:
+        sh.values_batch_update(body=body)
+
+
+def _resize_stepwise(ws, target_r: int, target_c: int):
+    """Fallback: grow the grid RESIZE_STEP_ROWS/RESIZE_STEP_COLS at a time."""
+    r = ws.row_count
+    c = ws.col_count
+    while r < target_r or c < target_c:
+        r = min(target_r, r + RESIZE_STEP_ROWS) if r < target_r else r
+        c = min(target_c, c + RESIZE_STEP_COLS) if c < target_c else c
+        _resize(ws, r, c)
+
+
+def _ensure_ws(sh, tabs: dict, title: str, rows: int, cols: int):
+    ws = tabs.get(title)
+    created = ws is None
+    if created:
+        ws = _add_worksheet(sh, title, max(rows, 2), max(cols, 2))
+
+    need_rows = rows > ws.row_count
+    need_cols = cols > ws.col_count
+    if need_rows or need_cols:
+        target_r = max(rows, ws.row_count, 2)
+        target_c = max(cols, ws.col_count, 2)
+        try:
+            _resize(ws, target_r, target_c)
+        except Exception as e:
+            logger.warning(f"Single resize failed for '{title}', growing stepwise: {e}")
+            try:
+                _resize_stepwise(ws, target_r, target_c)
+            except Exception as e:
+                logger.warning(f"Resize skipped for '{title}': {e}")
 
     return ws, created
 
 
-def _clear_ws(ws):
+def _clear_tail(ws, rows: int, cols: int):
+    """Blank whatever lies outside the rows x cols just written (values only, one call)."""
+    ranges = []
+    if ws.row_count > rows:
+        ranges.append(f"A{rows + 1}:{rowcol_to_a1(ws.row_count, ws.col_count)}")
+    if ws.col_count > cols:
+        ranges.append(f"{rowcol_to_a1(1, cols + 1)}:{rowcol_to_a1(rows, ws.col_count)}")
+    if not ranges:
+        return
     try:
-        _retry(ws.clear)
+        _batch_clear(ws, ranges)
     except Exception as e:
         logger.warning(f"Clear skipped for '{ws.title}': {e}")
 
 
 def _to_sheet_friendly(df: pd.DataFrame) -> pd.DataFrame:
     """Convert date/time/etc. into strings/None for Sheets API."""
-    out = df.copy()
-
-    for col in out.columns:
-        s = out[col]
-        if pd.api.types.is_datetime64_any_dtype(s):
-            out[col] = s.dt.strftime("%Y-%m-%d %H:%M:%S").where(~s.isna(), None)
-        elif pd.api.types.is_timedelta64_dtype(s):
-            out[col] = s.astype("string").where(~s.isna(), None)
-        elif hasattr(pd.api.types, "is_period_dtype") and pd.api.types.is_period_dtype(s):
-            out[col] = s.astype("string").where(~s.isna(), None)
 
     def _cell(v):
-        if v is None or (isinstance(v, float) and np.isnan(v)):
+        if v is None or v is pd.NaT or v is pd.NA or (isinstance(v, float) and np.isnan(v)):
             return None
+        # isoformat() skips strftime's format-string parsing; wall-clock time, no UTC offset
         if isinstance(v, (pd.Timestamp, datetime)):
-            return v.strftime("%Y-%m-%d %H:%M:%S")
+            return v.replace(tzinfo=None).isoformat(sep=" ", timespec="seconds")
         if isinstance(v, date):
             return v.isoformat()
         if isinstance(v, dtime):
-            return v.strftime("%H:%M:%S")
+            return v.replace(tzinfo=None).isoformat(timespec="seconds")
         if isinstance(v, (np.integer,)):
             return int(v)
         if isinstance(v, (np.floating,)):
@@ -149,78 +177,155 @@ def _to_sheet_friendly(df: pd.DataFrame) -> pd.DataFrame:
             return bool(v)
         return v
 
-    for col in out.columns:
-        if out[col].dtype == "object":
-            out[col] = out[col].map(_cell)
-
-    out = out.where(pd.notnull(out), None)
-    return out
-
-
-def _write_dataframe_chunked(ws, df: pd.DataFrame, chunk_size: int = CHUNK_ROWS):
+    # one converted Series per column, missing values handled per dtype;
+    # the frame is built once at the end instead of copying df up front
+    cols = {}
+    for col in df.columns:
+        s = df[col]
+        kind = s.dtype.kind if isinstance(s.dtype, np.dtype) else None
+        if kind in ("b", "i", "u") or (kind == "f" and not s.hasnans):
+            # nothing to convert: .tolist() already yields Python scalars
+            cols[col] = s
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            cols[col] = s.dt.strftime("%Y-%m-%d %H:%M:%S").where(~s.isna(), None)
+        elif pd.api.types.is_timedelta64_dtype(s):
+            cols[col] = s.astype("string").where(~s.isna(), None)
+        elif hasattr(pd.api.types, "is_period_dtype") and pd.api.types.is_period_dtype(s):
+            cols[col] = s.astype("string").where(~s.isna(), None)
+        elif s.dtype == "object":
+            inferred = pd.api.types.infer_dtype(s, skipna=True)
+            if inferred in ("string", "empty"):
+                cols[col] = s.where(s.notna(), None)
+            elif inferred == "date":
+                # date.isoformat() covers any year; datetime64[ns] would overflow outside 1677-2262
+                cols[col] = s.map(lambda v: v.isoformat() if v is not None else None)
+            else:
+                cols[col] = s.map(_cell)
+        else:
+            # floats with NaN, nullable and categorical dtypes
+            cols[col] = s.astype(object).where(s.notna(), None)
+
+    return pd.DataFrame(cols, index=df.index, copy=False)
+
+
+def _write_dataframe_chunked(ws, df: pd.DataFrame, chunk_size: int = CHUNK_ROWS, offset: int = 0):
+    """Write df starting at data row `offset` in one values.batchUpdate (one range per chunk).
+
+    The header is only written when offset is 0.
+    """
     df_norm = _to_sheet_friendly(df)
 
-    # header
-    header = [list(map(str, df_norm.columns.tolist()))]
-    _retry(ws.update, "A1", header)
-    time.sleep(0.1)
+    data = []
+    if offset == 0:
+        header = [list(map(str, df_norm.columns.tolist()))]
+        data.append({"range": f"'{ws.title}'!A1", "values": header})
 
     n = len(df_norm)
-    if n == 0:
-        return
-
     for start in range(0, n, chunk_size):
         end = min(n, start + chunk_size)
         values = df_norm.iloc[start:end].values.tolist()
-        a1_row = 2 + start
-        a1_range = f"A{a1_row}"
-        _retry(ws.update, a1_range, values)
-        logger.info(f"[{ws.title}] wrote rows {start+1}–{end}")
-        time.sleep(0.2)
+        data.append({"range": f"'{ws.title}'!A{2 + offset + start}", "values": values})
+
+    if not data:
+        return
+
+    _values_batch_update(ws.spreadsheet, {"valueInputOption": "RAW", "data": data})
+    if n:
+        logger.info(f"[{ws.title}] wrote rows {offset+1}–{offset+n}")
 
 
 # ----------------------
 # MAIN EXPORT
 # ----------------------
-def export_gold_to_sheets():
-    if not all([DB_URL, GOLD_SPREADSHEET_ID, SERVICE_ACCOUNT_PATH]):
-        raise RuntimeError("Missing DB_URL / GOLD_SPREADSHEET_ID / GOOGLE_APPLICATION_CREDENTIALS")
+def _chunk_digest_bytes(df: pd.DataFrame) -> bytes:
+    """Bytes that fingerprint df's values: raw buffers for numeric columns, hash_array otherwise."""
+    parts = []
+    for c in df.columns:
+        arr = df[c].to_numpy()
+        if arr.dtype.kind in "biufcmM":
+            # fixed-width values: the buffer itself is the fingerprint (a memcpy, no hashing pass)
+            parts.append(np.ascontiguousarray(arr).tobytes())
+        else:
+            # object columns hold pointers, so hash their values instead
+            parts.append(pd.util.hash_array(arr).tobytes())
+    return b"".join(parts)
+
+
+def _gold_row_counts(engine) -> dict:
+    """Row counts for every gold table in one UNION ALL round-trip."""
+    query = " UNION ALL ".join(
+        f"SELECT '{t}' AS table_name, COUNT(*) AS n FROM gold.\"{t}\"" for t in GOLD_TABLES
+    )
+    with engine.connect() as conn:
+        return dict(conn.execute(text(query)).all())
 
-    engine = create_engine(DB_URL)
-    gc = gspread.service_account(filename=SERVICE_ACCOUNT_PATH)
-    sh = gc.open_by_key(GOLD_SPREADSHEET_ID)
 
-    logger.info("Gold→Sheets export started")
+def _export_one(t: str, total: int, engine, sh, tabs: dict):
+    """Export one gold table on its own pooled connection."""
     with engine.connect() as conn:
-        for t in GOLD_TABLES:
-            df = pd.read_sql(text(f'SELECT * FROM gold."{t}"'), conn)
+        query = f'SELECT * FROM gold."{t}" ORDER BY {GOLD_ORDER_BY[t]}'
 
-            # optional row cap
-            limit = ROW_LIMITS.get(t)
-            if limit and len(df) > limit:
-                logger.warning(f"Table {t} has {len(df)} rows; exporting only first {limit}.")
-                df = df.head(limit)
+        # optional row cap
+        limit = ROW_LIMITS.get(t)
+        if limit and total > limit:
+            logger.warning(f"Table {t} has {total} rows; exporting only first {limit}.")
+            query += f" LIMIT {int(limit)}"
+            total = limit
 
-            rows_needed = len(df) + 1
-            cols_needed = max(len(df.columns), 1)
-            ws, created = _ensure_ws(sh, title=t, rows=rows_needed, cols=cols_needed)
+        written = 0
+        md5 = hashlib.md5()
+        ws = None
+        for chunk in pd.read_sql(text(query), conn, chunksize=BATCH_ROWS):
+            if ws is None:
+                rows_needed = total + 1
+                cols_needed = max(len(chunk.columns), 1)
+                ws, created = _ensure_ws(sh, tabs, title=t, rows=rows_needed, cols=cols_needed)
 
-            _clear_ws(ws)
-            _write_dataframe_chunked(ws, df, chunk_size=CHUNK_ROWS)
+            _write_dataframe_chunked(ws, chunk, chunk_size=CHUNK_ROWS, offset=written)
+            if written == 0:
+                md5.update("\x1f".join(map(str, chunk.columns)).encode())
+            md5.update(_chunk_digest_bytes(chunk))
+            written += len(chunk)
 
-            md5 = pd.util.hash_pandas_object(df.fillna("__NA__"), index=True).sum()
-            logger.info(f"Exported {t} | rows={len(df)} | md5_like={md5}")
+        # the writes above overwrite in place; only leftovers from a bigger previous export need clearing
+        if not created:
+            _clear_tail(ws, rows=written + 1, cols=cols_needed)
 
-        # meta tab
-        try:
-            meta = pd.DataFrame([{
-                "last_export_utc": pd.Timestamp.utcnow().isoformat(timespec="seconds"),
-                "table_count": len(GOLD_TABLES)
-            }])
-            ws_meta, _ = _ensure_ws(sh, title="meta_refresh", rows=5, cols=len(meta.columns))
-            _clear_ws(ws_meta)
-            _write_dataframe_chunked(ws_meta, meta, chunk_size=CHUNK_ROWS)
-        except Exception as e:
-            logger.warning(f"meta_refresh write skipped: {e}")
+    logger.info(f"Exported {t} | rows={written} | md5_like={md5.hexdigest()}")
+
+
+def export_gold_to_sheets():
+    if not all([DB_URL, GOLD_SPREADSHEET_ID, SERVICE_ACCOUNT_PATH]):
+        raise RuntimeError("Missing DB_URL / GOLD_SPREADSHEET_ID / GOOGLE_APPLICATION_CREDENTIALS")
+
+    # stream_results → server-side cursor, so only one chunk is held in memory at a time
+    engine = create_engine(
+        DB_URL,
+        pool_size=EXPORT_WORKERS,
+        execution_options={"stream_results": True, "yield_per": BATCH_ROWS},
+    )
+    sh = open_spreadsheet(GOLD_SPREADSHEET_ID)
+    # one metadata read up front; the workers only look their tab up (or add it)
+    tabs = worksheets_by_title(sh)
+
+    logger.info("Gold→Sheets export started")
+    counts = _gold_row_counts(engine)
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as pool:
+        futures = {pool.submit(_export_one, t, counts[t], engine, sh, tabs): t for t in GOLD_TABLES}
+        for fut in as_completed(futures):
+            fut.result()
+
+    # meta tab
+    try:
+        meta = pd.DataFrame([{
+            "last_export_utc": pd.Timestamp.utcnow().isoformat(timespec="seconds"),
+            "table_count": len(GOLD_TABLES)
+        }])
+        ws_meta, created = _ensure_ws(sh, tabs, title="meta_refresh", rows=5, cols=len(meta.columns))
+        _write_dataframe_chunked(ws_meta, meta, chunk_size=CHUNK_ROWS)
+        if not created:
+            _clear_tail(ws_meta, rows=len(meta) + 1, cols=len(meta.columns))
+    except Exception as e:
+        logger.warning(f"meta_refresh write skipped: {e}")
 
-    logger.info("Gold→Sheets export finished")
\ No newline at end of file
+    logger.info("Gold→Sheets export finished")
@@ -1,10 +1,11 @@
 # src/extract_from_sheets.py
-import os, glob, hashlib, logging, time
-import pandas as pd
-import gspread
-from gspread.exceptions import WorksheetNotFound, APIError
-from gspread_dataframe import get_as_dataframe
+import os, io, csv, glob, hashlib, logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from google.auth.transport.requests import AuthorizedSession
 from dotenv import load_dotenv
+from db import ENGINE, copy_csv, swap_table
+from gsheets import get_client, open_spreadsheet, retry, worksheets_by_title
 
 # -------------------------
 # Env & paths
@@ -14,6 +15,8 @@ load_dotenv()
 SOURCE_SPREADSHEET_ID = os.getenv("SOURCE_SPREADSHEET_ID")
 SERVICE_ACCOUNT_PATH  = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 BRONZE_DIR            = os.getenv("BRONZE_DIR", "./bronze_inputs")
+# Tabs are COPY'd straight into bronze.*; set KEEP_BRONZE_CSV=1 to also keep the CSVs for auditing
+KEEP_BRONZE_CSV       = os.getenv("KEEP_BRONZE_CSV", "0") == "1"
 
 if not SOURCE_SPREADSHEET_ID:
     raise RuntimeError("SOURCE_SPREADSHEET_ID not set in .env")
@@ -27,6 +30,10 @@ os.makedirs("logs", exist_ok=True)
 TAB_ORDER = ["patients", "doctors", "appointments", "prescriptions", "billing"]
 TAB_TO_CSV = {t: f"{t}.csv" for t in TAB_ORDER}
 
+# Sheets' own CSV export: one HTTPS download per tab, no JSON/values parsing
+CSV_EXPORT_URL = "https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export"
+DOWNLOAD_CHUNK = 1 << 20
+
 # -------------------------
 # File-only logging (no console output)
 # -------------------------
@@ -42,41 +49,84 @@ logger.addHandler(fh)
 # -------------------------
 # Helpers
 # -------------------------
-def _md5(b: bytes) -> str:
-    return hashlib.md5(b).hexdigest()
-
-def _gspread_client():
-    return gspread.service_account(filename=SERVICE_ACCOUNT_PATH)
-
-def _retry(call, *args, **kwargs):
-    """Retry wrapper to handle Google Sheets 429 rate limits."""
-    for i in range(5):
-        try:
-            return call(*args, **kwargs)
-        except APIError as e:
-            if "[429]" in str(e) and i < 4:
-                wait = 1.5 * (2 ** i)
-                logger.warning(f"Rate limit hit, retrying in {wait:.1f}s...")
-                time.sleep(wait)
-                continue
-            raise
-
-def _clean_df(df: pd.DataFrame) -> pd.DataFrame:
-    """Drop empty rows/cols, normalize headers."""
-    df = df.dropna(how="all").dropna(axis=1, how="all")
-    df.columns = [
-        (str(c).strip() if str(c) not in ("", "nan", "None") else f"col_{i}")
-        for i, c in enumerate(df.columns)
-    ]
-    return df
+@retry
+def _get_tab_csv(session, ws):
+    """Request one tab's CSV export as a streamed response."""
+    url = CSV_EXPORT_URL.format(spreadsheet_id=SOURCE_SPREADSHEET_ID)
+    resp = session.get(url, params={"format": "csv", "gid": ws.id}, stream=True)
+    if not resp.ok:
+        # release the connection before raising for retry (or the caller)
+        resp.close()
+        resp.raise_for_status()
+    return resp
+
+def _lines(chunks):
+    """Split byte chunks into decoded lines, newline kept (no UTF-8 character contains a newline byte)."""
+    rest = b""
+    for chunk in chunks:
+        *lines, rest = (rest + chunk).split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8") + "\n"
+    if rest:
+        yield rest.decode("utf-8")
+
+def _copy_tab_to_bronze(session, conn, ws, tab: str, path: str | None = None) -> tuple[int, str]:
+    """
+    Stream one tab's CSV export into bronze.<tab> with COPY (and to `path` if given).
+    Like _clean_df did, all-empty records are skipped and blank-header columns left out.
+    Returns (row_count, md5 of the cleaned CSV), both computed in the same pass.
+    """
+    resp = _get_tab_csv(session, ws)
+    md5 = hashlib.md5()
+
+    with resp, conn.cursor() as cur, (open(path, "wb") if path else nullcontext()) as f:
+        records = csv.reader(_lines(resp.iter_content(chunk_size=DOWNLOAD_CHUNK)))
+
+        # header row → COPY column list (matches to_sql's by-name mapping); Sheets pads
+        # the export with unnamed empty columns, which have no bronze column to go to
+        header = next(records, [])
+        keep = [i for i, c in enumerate(header) if c.strip() not in ("", "nan", "None")]
+        columns = [header[i].strip() for i in keep]
+        blank = [i for i in range(len(header)) if i not in keep]
+
+        def _emit(buf):
+            data = buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            md5.update(data)
+            if f:
+                f.write(data)
+            return data
+
+        def _clean():
+            buf = io.StringIO()
+            out = csv.writer(buf, lineterminator="\n")
+            out.writerow(columns)
+            for rec in records:
+                if not any(rec):
+                    continue
+                if any(rec[len(header):]) or any(rec[i] for i in blank if i < len(rec)):
+                    raise ValueError(f"{tab}: line {records.line_num} has values under a blank or missing header")
+                out.writerow([rec[i] if i < len(rec) else "" for i in keep])
+                if buf.tell() >= DOWNLOAD_CHUNK:
+                    yield _emit(buf)
+            yield _emit(buf)
+
+        # load into a fresh copy while the download streams; bronze.<tab> is only locked for the swap
+        with swap_table(cur, f"bronze.{tab}") as stage:
+            rows = copy_csv(cur, stage, columns, _clean()) if columns else 0
+    conn.commit()
+
+    return rows, md5.hexdigest()
 
 # -------------------------
 # Main Extractor
 # -------------------------
 def export_tabs_to_bronze_inputs():
-    logger.info("Sheets → CSV export started")
+    logger.info("Sheets → bronze export started")
 
-    # 1) Remove old CSVs (keeps folder tidy & idempotent)
+    # 1) Remove old CSVs (keeps folder tidy & idempotent). Without KEEP_BRONZE_CSV none are
+    #    written back, so a later `etl.py bronze` can't reload stale files over this extract
     for old in glob.glob(os.path.join(BRONZE_DIR, "*.csv")):
         try:
             os.remove(old)
@@ -85,32 +135,32 @@ def export_tabs_to_bronze_inputs():
             logger.warning(f"Could not remove {old}: {e}")
 
     # 2) Connect to Sheets
-    gc = _gspread_client()
-    sh = _retry(gc.open_by_key, SOURCE_SPREADSHEET_ID)
-
-    # 3) Export each tab to CSV
-    stats = []
-    for tab in TAB_ORDER:
+    gc = get_client()
+    sh = open_spreadsheet(SOURCE_SPREADSHEET_ID)
+    # every tab resolved with one metadata read; the workers never touch sh (or gc's session)
+    tabs = worksheets_by_title(sh)
+    missing = [tab for tab in TAB_ORDER if tab not in tabs]
+    if missing:
+        raise RuntimeError(f"Tab not found in spreadsheet: {', '.join(repr(t) for t in missing)}")
+
+    # 3) COPY all tabs into bronze concurrently (one session + DB connection per worker)
+    def _fetch_tab(tab):
+        ws = tabs[tab]
+        path = os.path.join(BRONZE_DIR, TAB_TO_CSV[tab]) if KEEP_BRONZE_CSV else None
+        conn = ENGINE.raw_connection()
         try:
-            ws = _retry(sh.worksheet, tab)
-        except WorksheetNotFound:
-            raise RuntimeError(f"Tab not found in spreadsheet: '{tab}'")
-
-        df = get_as_dataframe(ws, evaluate_formulas=True, header=0)
-        df = _clean_df(df)
-
-        path = os.path.join(BRONZE_DIR, TAB_TO_CSV[tab])
-        df.to_csv(path, index=False)
-
-        with open(path, "rb") as f:
-            md5 = _md5(f.read())
+            with AuthorizedSession(gc.http_client.auth) as session:
+                rows, md5 = _copy_tab_to_bronze(session, conn, ws, tab, path)
+        finally:
+            conn.close()
 
-        stats.append((tab, len(df), md5, path))
-        logger.info(f"Wrote {path} | rows={len(df)} | md5={md5}")
+        logger.info(f"Loaded bronze.{tab} | rows={rows} | md5={md5}" + (f" | csv={path}" if path else ""))
+        return tab, rows, md5, path
 
-        time.sleep(0.5)  # gentle throttle
+    with ThreadPoolExecutor(max_workers=len(TAB_ORDER)) as pool:
+        stats = list(pool.map(_fetch_tab, TAB_ORDER))
 
-    logger.info("Sheets → CSV export completed")
+    logger.info("Sheets → bronze export completed")
     return stats
 
 # -------------------------
@@ -0,0 +1,197 @@
+# Gold layer definitions, kept free of db imports so the export can read them
+# (DB_URL only) without the PG* settings db.py requires
+
+# -------------------------
+# Gold views: (name, unique key, sort order, SELECT), in dependency order.
+# A view's rows have no order of their own (REFRESH CONCURRENTLY reshuffles
+# them), so the sort order is applied by whoever reads it, e.g. the export
+# -------------------------
+GOLD_VIEWS = [
+    # silver.billing is scanned once into this rollup; the revenue views and the dashboard read from it
+    ("billing_rollup", ["payment_status", "specialization", "payment_method", "month_year"], [], """
+        SELECT
+            b.payment_status,
+            d.specialization,
+            b.payment_method,
+            DATE_TRUNC('month', a.appointment_date)::DATE AS month_year,
+            SUM(b.amount) AS amount
+        FROM silver.billing b
+        JOIN silver.appointments a ON b.appointment_id = a.appointment_id
+        JOIN silver.doctors d ON a.doctor_id = d.doctor_id
+        GROUP BY b.payment_status, d.specialization, b.payment_method, DATE_TRUNC('month', a.appointment_date)
+    """),
+
+    # 1. Revenue by department
+    ("revenue_by_department", ["department"], [], """
+        SELECT
+            specialization AS department,
+            SUM(amount) AS total_revenue
+        FROM gold.billing_rollup
+        WHERE payment_status = 'Paid'
+        GROUP BY specialization
+    """),
+
+    # 2. Revenue by payment method
+    ("revenue_by_payment_method", ["payment_method"], ["total_revenue DESC"], """
+        SELECT
+            payment_method,
+            SUM(amount)::NUMERIC(12,2) AS total_revenue
+        FROM gold.billing_rollup
+        WHERE payment_status = 'Paid'
+        GROUP BY payment_method
+    """),
+
+    # 3. Total revenue
+    ("total_revenue", ["total_revenue"], [], """
+        SELECT
+            SUM(amount)::NUMERIC(12,2) AS total_revenue
+        FROM gold.billing_rollup
+        WHERE payment_status = 'Paid'
+    """),
+
+    # 4. Monthly revenue
+    ("revenue_monthly", ["month_year"], ["month_year"], """
+        SELECT
+            month_year,
+            SUM(amount)::NUMERIC(12,2) AS total_revenue
+        FROM gold.billing_rollup
+        WHERE payment_status = 'Paid'
+        GROUP BY month_year
+    """),
+
+    # 5. Appointment utilization per doctor
+    ("appointment_utilization_doctor", ["doctor_id"], ["completion_rate DESC"], """
+        SELECT
+            d.doctor_id,
+            d.name AS doctor_name,
+            COUNT(a.appointment_id) AS total_appointments,
+            SUM(CASE WHEN a.status = 'Completed' THEN 1 ELSE 0 END) AS completed_appointments,
+            ROUND(
+                (SUM(CASE WHEN a.status = 'Completed' THEN 1 ELSE 0 END)::NUMERIC / NULLIF(COUNT(a.appointment_id),0)) * 100,
+                2
+            ) AS completion_rate
+        FROM silver.appointments a
+        JOIN silver.doctors d ON a.doctor_id = d.doctor_id
+        GROUP BY d.doctor_id, d.name
+    """),
+
+    # 6. Appointment utilization per patient
+    ("appointment_utilization_patient", ["patient_id"], ["completion_rate DESC"], """
+        SELECT
+            p.patient_id,
+            p.name AS patient_name,
+            COUNT(a.appointment_id) AS total_appointments,
+            SUM(CASE WHEN a.status = 'Completed' THEN 1 ELSE 0 END) AS completed_appointments,
+            ROUND(
+                (SUM(CASE WHEN a.status = 'Completed' THEN 1 ELSE 0 END)::NUMERIC / NULLIF(COUNT(a.appointment_id),0)) * 100,
+                2
+            ) AS completion_rate
+        FROM silver.appointments a
+        JOIN silver.patients p ON a.patient_id = p.patient_id
+        GROUP BY p.patient_id, p.name
+    """),
+
+    # 7. Doctor performance (Top 2 per department)
+    # each department's doctors come off the (specialization, doctor_id) index and each
+    # doctor's patient count off the (doctor_id, patient_id) one, so every doctor is
+    # counted once and the top-2 sort only sees one department's doctors
+    ("doctor_performance", ["doctor_id"], ["department", "patient_count DESC"], """
+        SELECT t.doctor_id, s.specialization AS department, t.name AS doctor_name, t.patient_count
+        FROM (SELECT DISTINCT specialization FROM silver.doctors) s
+        CROSS JOIN LATERAL (
+            SELECT
+                d.doctor_id,
+                d.name,
+                (SELECT COUNT(DISTINCT a.patient_id) FROM silver.appointments a
+                 WHERE a.doctor_id = d.doctor_id) AS patient_count
+            FROM silver.doctors d
+            WHERE d.specialization = s.specialization
+            ORDER BY patient_count DESC
+            LIMIT 2
+        ) t
+    """),
+
+    # 8. Patient insights
+    ("patient_insights", ["age_group", "gender"], ["age_group", "gender"], """
+        SELECT
+            CASE
+                WHEN age < 18 THEN '0-17'
+                WHEN age BETWEEN 18 AND 35 THEN '18-35'
+                WHEN age BETWEEN 36 AND 50 THEN '36-50'
+                WHEN age BETWEEN 51 AND 65 THEN '51-65'
+                ELSE '65+'
+            END AS age_group,
+            gender,
+            COUNT(*) AS patient_count
+        -- age is computed once per patient instead of once per CASE branch
+        FROM (
+            SELECT gender, EXTRACT(YEAR FROM AGE(CURRENT_DATE, dob))::INT AS age
+            FROM silver.patients
+        ) p
+        GROUP BY age_group, gender
+    """),
+
+    # 9. Medicine utilization
+    ("medicine_utilization", ["medicine_name"], ["prescription_count DESC"], """
+        SELECT
+            medicine AS medicine_name,
+            COUNT(*) AS prescription_count
+        FROM silver.prescriptions
+        GROUP BY medicine
+    """),
+
+    # 10. Outstanding revenue
+    ("outstanding_revenue", ["patient_id"], ["pending_amount DESC"], """
+        SELECT
+            b.patient_id,
+            p.name AS patient_name,
+            SUM(b.amount) AS pending_amount
+        FROM silver.billing b
+        JOIN silver.patients p
+            ON b.patient_id = p.patient_id
+        WHERE b.payment_status = 'Pending'
+        GROUP BY b.patient_id, p.name
+    """),
+
+    # 11. Appointments summary
+    ("appointments_summary", ["total_appointments"], [], """
+        SELECT
+            COUNT(*) AS total_appointments,
+            SUM(CASE WHEN status = 'Completed' THEN 1 ELSE 0 END) AS completed_appointments,
+            ROUND(
+                (SUM(CASE WHEN status = 'Completed' THEN 1 ELSE 0 END)::NUMERIC
+                 / NULLIF(COUNT(*),0)) * 100,
+                2
+            ) AS completion_rate
+        FROM silver.appointments
+    """),
+
+    # 12. Total patients
+    ("total_patients", ["total_patients"], [], """
+        SELECT COUNT(*) AS total_patients
+        FROM silver.patients
+    """),
+
+    # 13. Dashboard summary
+    # reuses the summaries refreshed above; silver.doctors is the only silver scan left
+    ("dashboard_summary", ["total_patients"], [], """
+        WITH revenue AS (
+            SELECT
+                COALESCE(SUM(amount) FILTER (WHERE payment_status='Paid'),0) AS total_revenue,
+                COALESCE(SUM(amount) FILTER (WHERE payment_status='Pending'),0) AS pending_revenue
+            FROM gold.billing_rollup
+        ),
+        doctors AS (
+            SELECT COUNT(*) AS total_doctors FROM silver.doctors
+        )
+        SELECT
+            p.total_patients,
+            d.total_doctors,
+            a.total_appointments,
+            COALESCE(a.completed_appointments, 0) AS completed_appointments,
+            a.completion_rate,
+            r.total_revenue,
+            r.pending_revenue
+        FROM gold.total_patients p, doctors d, gold.appointments_summary a, revenue r
+    """),
+]
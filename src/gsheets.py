@@ -0,0 +1,88 @@
+import os
+import time
+import random
+import logging
+import threading
+from functools import lru_cache, wraps
+import gspread
+from gspread.exceptions import APIError
+from requests import HTTPError
+from google.oauth2.service_account import Credentials
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERVICE_ACCOUNT_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+MAX_RETRIES      = 5
+RETRY_BASE_SLEEP = 1.5
+RATE_LIMIT_PAUSE = 1.0   # every worker holds off this long after any 429
+TRANSIENT_STATUS = (429, 500, 503)
+
+logger = logging.getLogger("gsheets")
+
+# One authorised client per process: the key file is parsed once and the
+# access token is reused by extract and export in the same run.
+_GC = None
+_GC_LOCK = threading.Lock()
+
+def get_client():
+    global _GC
+    with _GC_LOCK:
+        if _GC is None:
+            creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_PATH, scopes=SCOPES)
+            _GC = gspread.authorize(creds)
+    return _GC
+
+# time.monotonic() before which no worker should call the API (set on 429)
+_rate_limit_lock = threading.Lock()
+_rate_limited_until = 0.0
+
+def _wait_out_rate_limit():
+    with _rate_limit_lock:
+        delay = _rate_limited_until - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+def _note_rate_limit():
+    global _rate_limited_until
+    with _rate_limit_lock:
+        _rate_limited_until = max(_rate_limited_until, time.monotonic() + RATE_LIMIT_PAUSE)
+
+def retry(fn):
+    """
+    Retry transient Google API errors (gspread APIError or a raise_for_status() HTTPError
+    with status 429/500/503) with full-jitter exponential backoff.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        for i in range(MAX_RETRIES):
+            _wait_out_rate_limit()
+            try:
+                return fn(*args, **kwargs)
+            except (APIError, HTTPError) as e:
+                status = getattr(e.response, "status_code", None)
+                if status in TRANSIENT_STATUS and i < MAX_RETRIES - 1:
+                    if status == 429:
+                        _note_rate_limit()
+                    # full jitter keeps concurrent workers from retrying in lockstep
+                    sleep_s = random.uniform(0, RETRY_BASE_SLEEP * (2 ** i))
+                    logger.warning(f"{fn.__name__} retry {i+1}/{MAX_RETRIES} after {sleep_s:.1f}s due to: {e}")
+                    time.sleep(sleep_s)
+                    continue
+                raise
+    return wrapper
+
+@lru_cache(maxsize=None)
+@retry
+def open_spreadsheet(key):
+    return get_client().open_by_key(key)
+
+@retry
+def worksheets_by_title(sh) -> dict:
+    """Every tab of sh by title, from a single metadata read."""
+    return {ws.title: ws for ws in sh.worksheets()}
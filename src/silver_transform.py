@@ -1,286 +1,260 @@
-import pandas as pd
+import os
 import logging
-from db import get_engine, reject_row
 
 
 # -------------------------
-# Utility: Safe integer conversion
+# Utility: SQL parsing helpers & set-based loader
 # -------------------------
-def safe_int(value):
-    """Convert strings like '000123', '46601.0' to int. Return None if invalid."""
-    try:
-        cleaned = str(value).strip()
-        return int(float(cleaned))
-    except Exception:
-        return None
+# NULL instead of an error for unparseable values, so bad rows can be routed to
+# audit.rejected_rows in the same statement that loads the good ones
+SILVER_FUNCTIONS = [
+    # whole-number strings (what int() accepts) within INT range
+    """
+    CREATE OR REPLACE FUNCTION silver.try_int(s text) RETURNS int
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN NOT btrim(s) ~ '^[+-]?[0-9]+$' THEN NULL
+            WHEN btrim(s)::numeric BETWEEN -2147483648 AND 2147483647 THEN btrim(s)::int
+        END
+    $$
+    """,
+    # decimal / exponent strings; NaN and Infinity are not accepted
+    """
+    CREATE OR REPLACE FUNCTION silver.try_numeric(s text) RETURNS numeric
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN btrim(s) ~ '^[+-]?([0-9]+[.]?[0-9]*|[.][0-9]+)([eE][+-]?[0-9]{1,3})?$' THEN btrim(s)::numeric
+        END
+    $$
+    """,
+    # strings like '000123', '46601.0' → INT (truncating)
+    """
+    CREATE OR REPLACE FUNCTION silver.try_trunc_int(s text) RETURNS int
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN trunc(t.n) BETWEEN -2147483648 AND 2147483647 THEN trunc(t.n)::int
+        END
+        FROM silver.try_numeric(s) AS t(n)
+    $$
+    """,
+    # anything the server's date input accepts (depends on DateStyle, hence STABLE),
+    # limited to what pd.to_datetime accepted: no special inputs ('epoch', 'infinity',
+    # 'today', ...) and only pandas' datetime64[ns] range, 1677-09-22..2262-04-11.
+    # YYYY-MM-DD is range-checked inline so only other formats pay for the
+    # subtransaction of the EXCEPTION block
+    """
+    CREATE OR REPLACE FUNCTION silver.try_date(s text) RETURNS date
+    LANGUAGE plpgsql STABLE AS $$
+    DECLARE
+        t text := btrim(s);
+        d date;
+    BEGIN
+        IF t IS NULL OR t ~* '^[+-]?(epoch|infinity|now|today|tomorrow|yesterday)$' THEN
+            RETURN NULL;
+        END IF;
+        IF t ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}$' THEN
+            IF substr(t, 1, 4)::int < 1 OR substr(t, 6, 2)::int NOT BETWEEN 1 AND 12 THEN
+                RETURN NULL;
+            END IF;
+            IF substr(t, 9, 2)::int NOT BETWEEN 1 AND
+               extract(day FROM (substr(t, 1, 7) || '-01')::date + interval '1 month - 1 day') THEN
+                RETURN NULL;
+            END IF;
+            d := t::date;
+        ELSE
+            BEGIN
+                d := t::date;
+            EXCEPTION WHEN others THEN
+                RETURN NULL;
+            END;
+        END IF;
+        IF NOT isfinite(d) OR d NOT BETWEEN DATE '1677-09-22' AND DATE '2262-04-11' THEN
+            RETURN NULL;
+        END IF;
+        RETURN d;
+    END
+    $$
+    """,
+]
+
+
+def create_silver_functions(conn):
+    with conn.cursor() as cursor:
+        for ddl in SILVER_FUNCTIONS:
+            cursor.execute(ddl)
+    conn.commit()
+
+
+SILVER_INDEXES_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql", "silver_indexes.sql")
+
+
+def create_silver_indexes(conn):
+    """Apply sql/silver_indexes.sql (indexes for the gold queries + ANALYZE) after a silver load."""
+    with open(SILVER_INDEXES_SQL, encoding="utf-8") as f, conn.cursor() as cursor:
+        cursor.execute(f.read())
+    conn.commit()
+
+
+def _load(conn, table, columns, conflict_key, checked):
+    """
+    Load bronze.<table> into silver.<table> with one statement; no rows leave the server.
+    `checked` is a SELECT yielding the bronze row as `raw`, the parsed silver columns and
+    a `reason` (first failing check, NULL if valid); invalid rows go to audit.rejected_rows.
+    """
+    cols = ", ".join(columns)
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            WITH checked AS ({checked}),
+            loaded AS (
+                INSERT INTO silver.{table} ({cols})
+                SELECT {cols} FROM checked WHERE reason IS NULL
+                ON CONFLICT ({conflict_key}) DO NOTHING
+            ),
+            rejected AS (
+                INSERT INTO audit.rejected_rows (table_name, row_data, error_reason)
+                SELECT %s, to_jsonb(raw), reason FROM checked WHERE reason IS NOT NULL
+            )
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE reason IS NULL) FROM checked
+        """, (table,))
+        total, loaded = cursor.fetchone()
+    conn.commit()
+
+    logging.info(f"{table} | {total} rows checked | {loaded} loaded | {total - loaded} rejected")
 
 
 # -------------------------
 # Patients Transformation
 # -------------------------
 def transform_patients(conn):
-    engine = get_engine()
-    df = pd.read_sql("SELECT * FROM bronze.patients", engine)
-
-    valid_rows, rejected = [], []
-
-    for _, row in df.iterrows():
-        try:
-            patient_id = int(row["patient_id"])
-            dob = pd.to_datetime(row["dob"], errors="coerce")
-            if pd.isna(dob) or dob > pd.Timestamp.today():
-                raise ValueError("Invalid DOB")
-
-            gender = str(row["gender"]).strip().lower()
-            if gender in ["m", "male"]:
-                gender = "M"
-            elif gender in ["f", "female"]:
-                gender = "F"
-            else:
-                gender = "Other"
-
-            valid_rows.append((
-                patient_id,
-                row["name"],
-                gender,
-                dob.date(),
-                row["city"],
-                row["contact_no"]
-            ))
-        except Exception as e:
-            rejected.append((row.to_dict(), str(e)))
-
-    if valid_rows:
-        cursor = conn.cursor()
-        cursor.executemany("""
-            INSERT INTO silver.patients (patient_id, name, gender, dob, city, contact_no)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (patient_id) DO NOTHING
-        """, valid_rows)
-        conn.commit()
-        cursor.close()
-
-    for row, reason in rejected:
-        reject_row("patients", row, reason, conn)
-
-    logging.info(f"patients | {len(df)} rows checked | {len(valid_rows)} loaded | {len(rejected)} rejected")
+    _load(conn, "patients", ["patient_id", "name", "gender", "dob", "city", "contact_no"], "patient_id", """
+        SELECT
+            b AS raw, p.*,
+            CASE
+                WHEN p.patient_id IS NULL THEN 'Invalid patient_id'
+                WHEN p.dob IS NULL OR p.dob > CURRENT_DATE THEN 'Invalid DOB'
+            END AS reason
+        FROM bronze.patients b
+        CROSS JOIN LATERAL (
+            SELECT
+                silver.try_int(b.patient_id) AS patient_id,
+                b.name,
+                CASE lower(btrim(b.gender))
+                    WHEN 'm' THEN 'M' WHEN 'male' THEN 'M'
+                    WHEN 'f' THEN 'F' WHEN 'female' THEN 'F'
+                    ELSE 'Other'
+                END AS gender,
+                silver.try_date(b.dob) AS dob,
+                b.city,
+                b.contact_no
+        ) p
+    """)
 
 # -------------------------
 # Doctors Transformation
 # -------------------------
 def transform_doctors(conn):
-    engine = get_engine()
-    df = pd.read_sql("SELECT * FROM bronze.doctors", engine)
-
-    valid_rows, rejected = [], []
-
-    for _, row in df.iterrows():
-        try:
-            doctor_id = int(row["doctor_id"])
-            years_experience = int(row["years_experience"])
-            if years_experience < 0:
-                raise ValueError("Negative experience not allowed")
-
-            valid_rows.append((
-                doctor_id,
-                row["name"],
-                row["specialization"]
-            ))
-        except Exception as e:
-            rejected.append((row.to_dict(), str(e)))
-
-    if valid_rows:
-        cursor = conn.cursor()
-        cursor.executemany("""
-            INSERT INTO silver.doctors (doctor_id, name, specialization)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (doctor_id) DO NOTHING
-        """, valid_rows)
-        conn.commit()
-        cursor.close()
-
-    for row, reason in rejected:
-        reject_row("doctors", row, reason, conn)
-
-    logging.info(f"doctors | {len(df)} rows checked | {len(valid_rows)} loaded | {len(rejected)} rejected")
+    _load(conn, "doctors", ["doctor_id", "name", "specialization"], "doctor_id", """
+        SELECT
+            b AS raw, p.*,
+            CASE
+                WHEN p.doctor_id IS NULL THEN 'Invalid doctor_id'
+                WHEN p.years_experience IS NULL THEN 'Invalid years_experience'
+                WHEN p.years_experience < 0 THEN 'Negative experience not allowed'
+            END AS reason
+        FROM bronze.doctors b
+        CROSS JOIN LATERAL (
+            SELECT
+                silver.try_int(b.doctor_id) AS doctor_id,
+                b.name,
+                b.specialization,
+                silver.try_int(b.years_experience) AS years_experience
+        ) p
+    """)
 
 # -------------------------
 # Appointments Transformation
 # -------------------------
 def transform_appointments(conn):
-    engine = get_engine()
-    df = pd.read_sql("SELECT * FROM bronze.appointments", engine)
-
-    valid_rows, rejected = [], []
-
     # FK checks: valid patients & doctors
-    cursor = conn.cursor()
-    cursor.execute("SELECT patient_id FROM silver.patients")
-    valid_patients = {row[0] for row in cursor.fetchall()}
-
-    cursor.execute("SELECT doctor_id FROM silver.doctors")
-    valid_doctors = {row[0] for row in cursor.fetchall()}
-    cursor.close()
-
-    for _, row in df.iterrows():
-        try:
-            appointment_id = int(row["appointment_id"])
-            patient_id = int(row["patient_id"])
-            doctor_id = int(row["doctor_id"])
-            appointment_date = pd.to_datetime(row["appointment_date"], errors="coerce")
-            if pd.isna(appointment_date):
-                raise ValueError("Invalid appointment_date")
-
-            if patient_id not in valid_patients:
-                raise ValueError(f"Patient {patient_id} not found in silver.patients")
-            if doctor_id not in valid_doctors:
-                raise ValueError(f"Doctor {doctor_id} not found in silver.doctors")
-
-            status = str(row["status"]).capitalize()
-            if status not in ["Scheduled", "Completed", "Cancelled"]:
-                raise ValueError("Invalid status")
-
-            valid_rows.append((appointment_id, patient_id, doctor_id, appointment_date.date(), status))
-        except Exception as e:
-            rejected.append((row.to_dict(), str(e)))
-
-    if valid_rows:
-        cursor = conn.cursor()
-        cursor.executemany("""
-            INSERT INTO silver.appointments (appointment_id, patient_id, doctor_id, appointment_date, status)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (appointment_id) DO NOTHING
-        """, valid_rows)
-        conn.commit()
-        cursor.close()
-
-    for row, reason in rejected:
-        reject_row("appointments", row, reason, conn)
-
-    logging.info(f"appointments | {len(df)} rows checked | {len(valid_rows)} loaded | {len(rejected)} rejected")
-
-def safe_int(value):
-    """Convert strings like '000123', '46601.0' to int. Return None if invalid."""
-    try:
-        cleaned = str(value).strip()
-        return int(float(cleaned))
-    except Exception:
-        return None
+    _load(conn, "appointments", ["appointment_id", "patient_id", "doctor_id", "appointment_date", "status"], "appointment_id", """
+        SELECT
+            b AS raw, p.*,
+            CASE
+                WHEN p.appointment_id IS NULL THEN 'Invalid appointment_id'
+                WHEN p.patient_id IS NULL THEN 'Invalid patient_id'
+                WHEN p.doctor_id IS NULL THEN 'Invalid doctor_id'
+                WHEN p.appointment_date IS NULL THEN 'Invalid appointment_date'
+                WHEN NOT EXISTS (SELECT 1 FROM silver.patients s WHERE s.patient_id = p.patient_id)
+                    THEN 'Patient ' || p.patient_id || ' not found in silver.patients'
+                WHEN NOT EXISTS (SELECT 1 FROM silver.doctors s WHERE s.doctor_id = p.doctor_id)
+                    THEN 'Doctor ' || p.doctor_id || ' not found in silver.doctors'
+                WHEN p.status IS NULL OR p.status NOT IN ('Scheduled', 'Completed', 'Cancelled') THEN 'Invalid status'
+            END AS reason
+        FROM bronze.appointments b
+        CROSS JOIN LATERAL (
+            SELECT
+                silver.try_int(b.appointment_id) AS appointment_id,
+                silver.try_int(b.patient_id) AS patient_id,
+                silver.try_int(b.doctor_id) AS doctor_id,
+                silver.try_date(b.appointment_date) AS appointment_date,
+                upper(left(b.status, 1)) || lower(substr(b.status, 2)) AS status
+        ) p
+    """)
 
 
 # -------------------------
 # Prescriptions Transformation
 # -------------------------
 def transform_prescriptions(conn):
-    engine = get_engine()
-    df = pd.read_sql("SELECT * FROM bronze.prescriptions", engine)
-
-    # Load valid appointment IDs from silver
-    valid_appointments = pd.read_sql("SELECT appointment_id FROM silver.appointments", engine)
-    valid_appointments_set = set(valid_appointments["appointment_id"].astype(int))
-
-    valid_rows, rejected = [], []
-
-    for _, row in df.iterrows():
-        try:
-            prescription_id = safe_int(row["prescription_id"])
-            appointment_id = safe_int(row["appointment_id"])
-            medicine = str(row["medicine"]).strip() if pd.notna(row["medicine"]) else None
-            dosage = row["dosage"]
-            duration_days = safe_int(row["duration_days"])
-
-            if prescription_id is None:
-                raise ValueError(f"Invalid prescription_id: {row['prescription_id']}")
-
-            if appointment_id is None or appointment_id not in valid_appointments_set:
-                raise ValueError(f"Invalid or missing appointment_id: {row['appointment_id']}")
-
-            if not medicine:
-                raise ValueError("Medicine cannot be NULL or empty")
-
-            valid_rows.append((
-                prescription_id,
-                appointment_id,
-                medicine,
-                dosage,
-                duration_days
-            ))
-        except Exception as e:
-            rejected.append((row.to_dict(), str(e)))
-
-    if valid_rows:
-        cursor = conn.cursor()
-        cursor.executemany("""
-            INSERT INTO silver.prescriptions (prescription_id, appointment_id, medicine, dosage, duration_days)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (prescription_id) DO NOTHING
-        """, valid_rows)
-        conn.commit()
-        cursor.close()
-
-    for row, reason in rejected:
-        reject_row("prescriptions", row, reason, conn)
-
-    logging.info(f"prescriptions | {len(df)} rows checked | {len(valid_rows)} loaded | {len(rejected)} rejected")
+    _load(conn, "prescriptions", ["prescription_id", "appointment_id", "medicine", "dosage", "duration_days"], "prescription_id", """
+        SELECT
+            b AS raw, p.*,
+            CASE
+                WHEN p.prescription_id IS NULL
+                    THEN 'Invalid prescription_id: ' || COALESCE(b.prescription_id, 'None')
+                WHEN NOT EXISTS (SELECT 1 FROM silver.appointments s WHERE s.appointment_id = p.appointment_id)
+                    THEN 'Invalid or missing appointment_id: ' || COALESCE(b.appointment_id, 'None')
+                WHEN COALESCE(p.medicine, '') = '' THEN 'Medicine cannot be NULL or empty'
+            END AS reason
+        FROM bronze.prescriptions b
+        CROSS JOIN LATERAL (
+            SELECT
+                silver.try_trunc_int(b.prescription_id) AS prescription_id,
+                silver.try_trunc_int(b.appointment_id) AS appointment_id,
+                btrim(b.medicine) AS medicine,
+                b.dosage,
+                silver.try_trunc_int(b.duration_days) AS duration_days
+        ) p
+    """)
 
 # -------------------------
 # Billing Transformation
 # -------------------------
 def transform_billing(conn):
-    engine = get_engine()
-    df = pd.read_sql("SELECT * FROM bronze.billing", engine)
-
-    valid_rows, rejected = [], []
-
     # FK checks: valid patients & appointments
-    cursor = conn.cursor()
-    cursor.execute("SELECT patient_id FROM silver.patients")
-    valid_patients = {row[0] for row in cursor.fetchall()}
-
-    cursor.execute("SELECT appointment_id FROM silver.appointments")
-    valid_appointments = {row[0] for row in cursor.fetchall()}
-    cursor.close()
-
-    for _, row in df.iterrows():
-        try:
-            bill_id = int(row["bill_id"])
-            patient_id = int(row["patient_id"])
-            appointment_id = int(row["appointment_id"])
-            amount = float(row["amount"])
-            if amount < 0:
-                raise ValueError("Negative billing amount")
-
-            if patient_id not in valid_patients:
-                raise ValueError(f"Patient {patient_id} not found in silver.patients")
-            if appointment_id not in valid_appointments:
-                raise ValueError(f"Appointment {appointment_id} not found in silver.appointments")
-
-            payment_status = str(row["payment_status"]).capitalize()
-            if payment_status not in ["Paid", "Pending"]:
-                raise ValueError("Invalid payment_status")
-
-            valid_rows.append((
-                bill_id,
-                patient_id,
-                appointment_id,
-                amount,
-                payment_status,
-                row["payment_method"]
-            ))
-        except Exception as e:
-            rejected.append((row.to_dict(), str(e)))
-
-    if valid_rows:
-        cursor = conn.cursor()
-        cursor.executemany("""
-            INSERT INTO silver.billing (bill_id, patient_id, appointment_id, amount, payment_status, payment_method)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (bill_id) DO NOTHING
-        """, valid_rows)
-        conn.commit()
-        cursor.close()
-
-    for row, reason in rejected:
-        reject_row("billing", row, reason, conn)
-
-    logging.info(f"billing | {len(df)} rows checked | {len(valid_rows)} loaded | {len(rejected)} rejected")
+    _load(conn, "billing", ["bill_id", "patient_id", "appointment_id", "amount", "payment_status", "payment_method"], "bill_id", """
+        SELECT
+            b AS raw, p.*,
+            CASE
+                WHEN p.bill_id IS NULL THEN 'Invalid bill_id'
+                WHEN p.patient_id IS NULL THEN 'Invalid patient_id'
+                WHEN p.appointment_id IS NULL THEN 'Invalid appointment_id'
+                WHEN p.amount IS NULL THEN 'Invalid amount'
+                WHEN p.amount < 0 THEN 'Negative billing amount'
+                WHEN NOT EXISTS (SELECT 1 FROM silver.patients s WHERE s.patient_id = p.patient_id)
+                    THEN 'Patient ' || p.patient_id || ' not found in silver.patients'
+                WHEN NOT EXISTS (SELECT 1 FROM silver.appointments s WHERE s.appointment_id = p.appointment_id)
+                    THEN 'Appointment ' || p.appointment_id || ' not found in silver.appointments'
+                WHEN p.payment_status IS NULL OR p.payment_status NOT IN ('Paid', 'Pending') THEN 'Invalid payment_status'
+            END AS reason
+        FROM bronze.billing b
+        CROSS JOIN LATERAL (
+            SELECT
+                silver.try_int(b.bill_id) AS bill_id,
+                silver.try_int(b.patient_id) AS patient_id,
+                silver.try_int(b.appointment_id) AS appointment_id,
+                silver.try_numeric(b.amount) AS amount,
+                upper(left(b.payment_status, 1)) || lower(substr(b.payment_status, 2)) AS payment_status,
+                b.payment_method
+        ) p
+    """)